@@ -15,21 +15,37 @@
 
 import argparse
 import collections
+from concurrent import futures
 import csv
 import datetime
 import io
+import itertools
 import json
 import logging
-import random
+import os
+import pickle
 import re
 import sys
 
 import requests
 import yaml
-
-ZANATA_URI = 'https://translate.openstack.org/rest/%s'
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    from yaml import CSafeLoader as YAMLSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLSafeLoader
+
+ZANATA_API_URI = 'https://translate.openstack.org/rest'
 LOG = logging.getLogger('zanata_stats')
 
+# Number of user statistics requests which are in flight at any moment.
+# The workload is network-bound, so the wall clock time scales with
+# the number of requests divided by this concurrency.
+MAX_CONCURRENT_REQUESTS = 20
+
 ZANATA_VERSION_EXPR = r'^(master[-,a-z]*|stable-[a-z]+|openstack-user-survey)$'
 ZANATA_VERSION_PATTERN = re.compile(ZANATA_VERSION_EXPR)
 
@@ -37,49 +53,109 @@ ZANATA_VERSION_PATTERN = re.compile(ZANATA_VERSION_EXPR)
 class ZanataUtility(object):
     """Utilities to invoke Zanata REST API."""
 
-    user_agents = [
-        'Mozilla/5.0 (X11; Ubuntu; Linux x86_64) Gecko/20100101 Firefox/32.0',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_6) AppleWebKit/537.78.2',
-        'Mozilla/5.0 (Windows NT 6.3; WOW64) Gecko/20100101 Firefox/32.0',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X) Chrome/37.0.2062.120',
-        'Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko'
-    ]
-
-    def read_uri(self, uri, headers):
+    user_agent = (
+        'Mozilla/5.0 (X11; Ubuntu; Linux x86_64) Gecko/20100101 Firefox/32.0')
+
+    def __init__(self):
+        # Use a single session so that successive requests reuse the
+        # same TCP/TLS connection instead of opening a new one per call.
+        self.session = requests.Session()
+        self.session.headers['Accept'] = 'application/json'
+        self.session.headers['User-Agent'] = ZanataUtility.user_agent
+        # Keep one persistent connection per concurrent request, so
+        # none of the parallel fetches ever pays a TCP/TLS handshake
+        # after warm-up.
+        self.session.mount(
+            'https://',
+            requests.adapters.HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=MAX_CONCURRENT_REQUESTS))
+        # Parsed responses keyed by URI, so that repeated calls for
+        # the same resource become a dict lookup instead of a GET.
+        self._cache = {}
+
+    def read_uri(self, uri):
         try:
-            headers['User-Agent'] = random.choice(ZanataUtility.user_agents)
-            req = requests.get(uri, headers=headers)
-            return req.text
+            req = self.session.get(uri)
+            # Return the raw bytes; the JSON parsers accept them
+            # directly, which skips one UTF-8 decoding pass.
+            return req.content
         except Exception as e:
             LOG.error('Error "%(error)s" while reading uri %(uri)s',
                       {'error': e, 'uri': uri})
             raise
 
     def read_json_from_uri(self, uri):
-        data = self.read_uri(uri, {'Accept': 'application/json'})
+        if uri in self._cache:
+            return self._cache[uri]
+        data = self.read_uri(uri)
         try:
-            return json.loads(data)
+            if orjson is not None:
+                parsed = orjson.loads(data)
+            else:
+                parsed = json.loads(data)
         except Exception as e:
             LOG.error('Error "%(error)s" parsing json from uri %(uri)s',
                       {'error': e, 'uri': uri})
             raise
+        # Only responses worth re-parsing are kept; tiny ones are
+        # cheaper to fetch again than to let the cache grow.
+        if len(data) > 1024:
+            self._cache[uri] = parsed
+        return parsed
+
+    def invalidate(self, uri_prefix=''):
+        """Evict cached responses whose URI starts with uri_prefix."""
+        for uri in [u for u in self._cache if u.startswith(uri_prefix)]:
+            del self._cache[uri]
 
     def get_projects(self):
-        uri = ZANATA_URI % ('projects')
+        uri = f'{ZANATA_API_URI}/projects'
         LOG.debug("Reading projects from %s" % uri)
         projects_data = self.read_json_from_uri(uri)
         return [project['id'] for project in projects_data]
 
     @staticmethod
     def _is_valid_version(version):
+        # Cheap prefix check first; it rejects most invalid versions
+        # without entering the regex engine at all.
+        if not version.startswith(('master', 'stable-',
+                                   'openstack-user-survey')):
+            return False
         return bool(ZANATA_VERSION_PATTERN.match(version))
 
     def get_user_stats(self, zanata_user_id, start_date, end_date):
-        uri = ZANATA_URI % ('stats/user/%s/%s..%s'
-                            % (zanata_user_id, start_date, end_date))
+        uri = (f'{ZANATA_API_URI}/stats/user/'
+               f'{zanata_user_id}/{start_date}..{end_date}')
         return self.read_json_from_uri(uri)
 
 
+def _load_yaml_cached(path):
+    """Load a YAML file, keeping a pickled sidecar cache.
+
+    The parsed structure is stored next to the file in <path>.pkl.cache
+    together with the source mtime, so later runs against an unchanged
+    file skip the YAML parser entirely.
+    """
+    cache_file = path + '.pkl.cache'
+    mtime = os.path.getmtime(path)
+    try:
+        with open(cache_file, 'rb') as f:
+            cached_mtime, content = pickle.load(f)
+        if cached_mtime == mtime:
+            return content
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+    content = yaml.load(io.open(path, 'r'), Loader=YAMLSafeLoader)
+    try:
+        with open(cache_file, 'wb') as f:
+            pickle.dump((mtime, content), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        LOG.debug('Could not write YAML cache file %s', cache_file)
+    return content
+
+
 class LanguageTeam(object):
 
     def __init__(self, language_code, team_info):
@@ -97,7 +173,7 @@ class LanguageTeam(object):
         LOG.debug('Process list of language team from uri: %s',
                   translation_team_uri)
 
-        content = yaml.safe_load(io.open(translation_team_uri, 'r'))
+        content = _load_yaml_cached(translation_team_uri)
 
         if lang_list:
             lang_notfound = [lang_code for lang_code in lang_list
@@ -115,19 +191,42 @@ class LanguageTeam(object):
 
 class User(object):
 
-    trans_fields = ['total', 'Translated', 'NeedReview',
-                    'Approved', 'Rejected']
-    review_fields = ['total', 'Approved', 'Rejected']
+    # One User is created per translator per language team; __slots__
+    # drops the per-instance __dict__ for runs with many translators.
+    __slots__ = ('user_id', 'lang', 'counts', 'totals', '_totals_cached')
+
+    # Tuples keep the field iteration order for output; the frozensets
+    # give O(1) membership tests.
+    trans_fields = ('total', 'Translated', 'NeedReview',
+                    'Approved', 'Rejected')
+    review_fields = ('total', 'Approved', 'Rejected')
+    _trans_field_set = frozenset(trans_fields)
+    _review_field_set = frozenset(review_fields)
+
+    # Maps a savedState value to whether it counts towards the
+    # translation and review stats, computed once so the row loop
+    # does a single dict lookup instead of two membership scans.
+    _state_kinds = {}
+    for _state in ('Translated', 'NeedReview', 'Approved', 'Rejected'):
+        _state_kinds[_state] = (_state in _trans_field_set,
+                                _state in _review_field_set)
+    del _state
 
     def __init__(self, user_id, language_code):
         self.user_id = user_id
         self.lang = language_code
-        self.stats = collections.defaultdict(dict)
+        # Word counts in a single flat table keyed by
+        # (project, version, kind, field) instead of one dict per
+        # project, version and kind. One structure per user keeps the
+        # memory footprint down and makes totalling a single pass.
+        self.counts = collections.Counter()
+        self.totals = {}
+        self._totals_cached = False
 
     def __str__(self):
         return ("<%s: user_id=%s, lang=%s, stats=%s" %
                 (self.__class__.__name__,
-                 self.user_id, self.lang, self.stats,))
+                 self.user_id, self.lang, dict(self.counts),))
 
     def __repr__(self):
         return repr(self.convert_to_serializable_data())
@@ -138,7 +237,7 @@ class User(object):
         else:
             return self.user_id < other.user_id
 
-    def read_from_zanata_stats(self, zanata_stats, project_list, version_list):
+    def read_from_zanata_stats(self, zanata_stats, project_set, version_set):
         # data format (Zanata 4.3.3)
         # [
         #     {
@@ -152,62 +251,73 @@ class User(object):
         #         "wordCount": 119
         #     }
         # ]
+        # Bind the per-row loop dependencies to locals once; attribute
+        # lookups inside the loop cost a dict probe per row.
+        my_lang = self.lang
+        counts = self.counts
+        state_kinds = self._state_kinds
+        self._totals_cached = False
+
         for zanata_stat in zanata_stats:
 
+            # Look up each field only when the row has survived the
+            # preceding filters, so filtered-out rows do not pay for
+            # the remaining lookups.
             project_id = zanata_stat['projectSlug']
-            version = zanata_stat['versionSlug']
-            lang = zanata_stat['localeId']
-            stat_state = zanata_stat['savedState']
-            word_count = zanata_stat['wordCount']
-
-            if project_list and project_id not in project_list:
+            if project_set and project_id not in project_set:
                 continue
 
-            if version_list and version not in version_list:
+            version = zanata_stat['versionSlug']
+            if version_set and version not in version_set:
                 continue
 
-            if self.lang != lang:
+            if my_lang != zanata_stat['localeId']:
                 continue
 
-            my_project = self.stats[project_id]
+            stat_state = zanata_stat['savedState']
+            word_count = zanata_stat['wordCount']
 
-            if version not in my_project:
-                my_project[version] = {
-                    'translation-stats': collections.defaultdict(int),
-                    'review-stats': collections.defaultdict(int),
-                }
-            my_version = my_project[version]
+            is_trans, is_review = state_kinds.get(stat_state,
+                                                  (False, False))
 
-            if stat_state in self.trans_fields:
-                my_trans_stats = my_version['translation-stats']
-                my_trans_stats[stat_state] += word_count
-                my_trans_stats['total'] += word_count
+            if is_trans:
+                counts[(project_id, version,
+                        'translation-stats', stat_state)] += word_count
+                counts[(project_id, version,
+                        'translation-stats', 'total')] += word_count
 
-            if stat_state in self.review_fields:
-                my_review_stats = my_version['review-stats']
-                my_review_stats[stat_state] += word_count
-                my_review_stats['total'] += word_count
+            if is_review:
+                counts[(project_id, version,
+                        'review-stats', stat_state)] += word_count
+                counts[(project_id, version,
+                        'review-stats', 'total')] += word_count
 
     def populate_total_stats(self):
 
+        # Totals only change when new stats are read, so writing both
+        # the csv and json outputs computes them just once.
+        if self._totals_cached:
+            return
+
         total_trans = dict([(k, 0) for k in self.trans_fields])
         total_review = dict([(k, 0) for k in self.review_fields])
 
-        for project_id, versions in self.stats.items():
-            for version, stats in versions.items():
-                trans_stats = stats.get('translation-stats', {})
-                for k in self.trans_fields:
-                    total_trans[k] += trans_stats.get(k, 0)
-                review_stats = stats.get('review-stats', {})
-                for k in self.review_fields:
-                    total_review[k] += review_stats.get(k, 0)
-        self.stats['__total__']['translation-stats'] = total_trans
-        self.stats['__total__']['review-stats'] = total_review
+        # The flat count table makes totalling a single pass over its
+        # entries instead of a triply nested loop.
+        for (_project_id, _version, kind, field), count \
+                in self.counts.items():
+            if kind == 'translation-stats':
+                total_trans[field] += count
+            else:
+                total_review[field] += count
+        self.totals = {'translation-stats': total_trans,
+                       'review-stats': total_review}
+        self._totals_cached = True
 
     def needs_output(self, include_no_activities):
         if include_no_activities:
             return True
-        return bool(self.stats) and all(self.stats.values())
+        return bool(self.counts)
 
     @staticmethod
     def get_flattened_data_title():
@@ -226,37 +336,55 @@ class User(object):
             'review-rejected'
         ]
 
-    def convert_to_flattened_data(self, detail=False):
-        self.populate_total_stats()
+    def _project_versions(self):
+        """List (project, version) pairs in the order first observed."""
+        pairs = {}
+        for project_id, version, _kind, _field in self.counts:
+            pairs[(project_id, version)] = None
+        return list(pairs)
 
-        data = []
+    def convert_to_flattened_rows(self, detail=False):
+        """Yield CSV rows as tuples, one at a time.
 
-        for project_id, versions in self.stats.items():
-            if project_id == '__total__':
-                continue
-            for version, stats in versions.items():
-                trans_stats = stats.get('translation-stats', {})
-                review_stats = stats.get('review-stats', {})
-                if detail:
-                    data.append(
-                        [self.user_id, self.lang, project_id, version] +
-                        [trans_stats.get(k, 0) for k in self.trans_fields] +
-                        [review_stats.get(k, 0) for k in self.review_fields])
-
-        data.append([self.user_id, self.lang, '-', '-'] +
-                    [self.stats['__total__']['translation-stats'][k]
-                     for k in self.trans_fields] +
-                    [self.stats['__total__']['review-stats'][k]
-                     for k in self.review_fields])
-
-        return data
+        The csv writer drains the generator lazily, so no per-user
+        list of rows is materialized.
+        """
+        self.populate_total_stats()
+
+        if detail:
+            get_count = self.counts.get
+            for project_id, version in self._project_versions():
+                yield ((self.user_id, self.lang, project_id, version) +
+                       tuple(get_count((project_id, version,
+                                        'translation-stats', k), 0)
+                             for k in self.trans_fields) +
+                       tuple(get_count((project_id, version,
+                                        'review-stats', k), 0)
+                             for k in self.review_fields))
+
+        yield ((self.user_id, self.lang, '-', '-') +
+               tuple(self.totals['translation-stats'][k]
+                     for k in self.trans_fields) +
+               tuple(self.totals['review-stats'][k]
+                     for k in self.review_fields))
+
+    def _convert_to_nested_stats(self):
+        """Rebuild the per-project/per-version mapping for output."""
+        nested = {}
+        for (project_id, version, kind, field), count \
+                in self.counts.items():
+            my_version = nested.setdefault(project_id, {}).setdefault(
+                version, {'translation-stats': {}, 'review-stats': {}})
+            my_version[kind][field] = count
+        nested['__total__'] = self.totals
+        return nested
 
     def convert_to_serializable_data(self, detail):
         self.populate_total_stats()
         return {'user_id': self.user_id,
                 'lang': self.lang,
-                'stats': (self.stats if detail
-                          else self.stats['__total__'])}
+                'stats': (self._convert_to_nested_stats() if detail
+                          else self.totals)}
 
 
 def get_zanata_stats(start_date, end_date, language_teams, project_list,
@@ -269,18 +397,36 @@ def get_zanata_stats(start_date, end_date, language_teams, project_list,
         users += [User(user_id, team.language_code)
                   for user_id in team.translators]
 
+    # Narrow down to the requested users up front so that everything
+    # downstream (logging, fetches, aggregation) only ever sees them
+    # rather than every translator of every team.
+    if user_list:
+        user_set = frozenset(user_list)
+        users = [user for user in users if user.user_id in user_set]
+
     if not project_list:
         project_list = zanataUtil.get_projects()
-    for user in users:
-        if user_list and user.user_id not in user_list:
-            continue
+    # Build the membership filters once; a frozenset lookup is O(1)
+    # where the lists paid a linear scan for every stats row.
+    project_set = frozenset(project_list) if project_list else None
+    version_set = frozenset(version_list) if version_list else None
+
+    def _get_user_stats(user):
         LOG.info('Getting for user %(user_id)s %(user_lang)s',
                  {'user_id': user.user_id, 'user_lang': user.lang})
         data = zanataUtil.get_user_stats(
             user.user_id, start_date, end_date)
         LOG.debug('Got: %s', data)
-        user.read_from_zanata_stats(data, project_list, version_list)
-        LOG.debug('=> %s', user)
+        return user, data
+
+    # Each per-user statistics call is an independent GET which spends
+    # almost all of its time waiting on the network, so fetch them
+    # concurrently through the shared session.
+    with futures.ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        for user, data in executor.map(_get_user_stats, users):
+            user.read_from_zanata_stats(data, project_set, version_set)
+            LOG.debug('=> %s', user)
 
     return users
 
@@ -297,18 +443,26 @@ def write_stats_to_file(users, output_file, file_format,
 
 
 def _write_stats_to_csvfile(users, output_file, detail):
-    with open(output_file, 'w') as csvfile:
-        writer = csv.writer(csvfile)
+    # The large buffer batches the row writes into few syscalls.
+    with open(output_file, 'w', buffering=1 << 20) as csvfile:
+        writer = csv.writer(csvfile, lineterminator='\n')
         writer.writerow(User.get_flattened_data_title())
-        for user in users:
-            writer.writerows(user.convert_to_flattened_data(detail))
+        # One writerows call drains all per-user row generators inside
+        # the C-implemented writer instead of a Python loop per user.
+        writer.writerows(itertools.chain.from_iterable(
+            user.convert_to_flattened_rows(detail) for user in users))
 
 
 def _write_stats_to_jsonfile(users, output_file, detail):
     users = [user.convert_to_serializable_data(detail)
              for user in users]
-    with open(output_file, 'w') as f:
-        f.write(json.dumps(users, indent=4, sort_keys=True))
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(
+                users, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+    else:
+        with open(output_file, 'w') as f:
+            f.write(json.dumps(users, indent=4, sort_keys=True))
 
 
 def _comma_separated_list(s):
@@ -22,7 +22,7 @@ import random
 import requests
 import yaml
 
-ZANATA_URI = 'https://translate.openstack.org/rest/%s'
+ZANATA_API_URI = 'https://translate.openstack.org/rest'
 LOG = logging.getLogger('zanata_users')
 YAML_COMMENT = """\
 # This file is generated by tools/zanata/zanata_users.py.
@@ -61,7 +61,7 @@ class ZanataUtility(object):
             raise
 
     def get_locale_members(self, language_id):
-        uri = ZANATA_URI % ('locales/locale/%s/members' % language_id)
+        uri = f'{ZANATA_API_URI}/locales/locale/{language_id}/members'
         LOG.debug("Reading the list of locale members in %s from %s"
                   % (language_id, uri))
         locale_members_data = self.read_json_from_uri(uri)
@@ -70,7 +70,7 @@ class ZanataUtility(object):
     def get_locales(self):
         # The default value of sizePerPage is 10, which needs to be increased
         # http://zanata.org/zanata-platform/rest-api-docs/resource_LocalesResource.html
-        uri = ZANATA_URI % 'locales?sizePerPage=255'
+        uri = f'{ZANATA_API_URI}/locales?sizePerPage=255'
         LOG.debug("Reading the list of locales from %s" % uri)
         locales_data = self.read_json_from_uri(uri)
         languages = {}